@@ -15,9 +15,11 @@ from . import text
 from . import settings
 from .triangulation import triangulation_outline
 from .blending import blenditer, match_length
+from .core import intersection_edge_plane, intersection_face_plane, intersection_axis_face
 
 from numbers import Number
 from functools import singledispatch, partial
+import numpy as np
 
 __all__ = [	'chamfer', 'filet', 'edgecut',
 			'mesh_cut', 'web_cut', 'planeoffsets',
@@ -103,10 +105,11 @@ def planeoffsets(mesh, edges, **cutter):
 	cutter = interpretcutter(**cutter)
 	# get adjacent faces' normals to lines
 	offsets = {e: [None,None]  for e in edges}
-	for f in mesh.faces:
+	normals = mesh.facenormals()
+	for fi, f in enumerate(mesh.faces):
 		for e in ((f[0],f[1]), (f[1],f[2]), (f[2],f[0])):
-			if e in offsets:					offsets[e][0] = mesh.facenormal(f)
-			elif (e[1],e[0]) in offsets:		offsets[(e[1],e[0])][1] = mesh.facenormal(f)
+			if e in offsets:					offsets[e][0] = normals[fi]
+			elif (e[1],e[0]) in offsets:		offsets[(e[1],e[0])][1] = normals[fi]
 	
 	# compute offsets (displacement on depth)
 	for e, adjacents in offsets.items():
@@ -130,7 +133,7 @@ def interpretcutter(**cutter):
 		return partial(func, dim)
 
 		
-def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
+def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True, ptmgr=None):
 	''' Propagation cut for an edge 
 		
 		:start:		the edge or point to start propagation from
@@ -138,9 +141,10 @@ def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
 		:stops:     the planes stopping the propagation. Their normal must be oriented toward the propagation area.
 		:removal:   the set in wich the function will put the indices of faces inside
 		:cutghost:  whether the function should propagate on faces already marked for removal (previously or during the propagation)
+		:ptmgr:     the `PointSet` managing the mesh points, pass it to share it between successive cuts instead of rebuilding it
 	'''
 	pts = mesh.points
-	ptmgr = hashing.PointSet(prec, manage=pts)
+	if ptmgr is None:	ptmgr = hashing.PointSet(prec, manage=pts)
 	stops = list(filter(lambda e:e, stops))
 	# find the intersections axis between the planes
 	axis = [intersection_plane_plane(cutplane, stop)	for stop in stops]
@@ -154,6 +158,7 @@ def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
 		raise TypeError('wrong start: {}, cut can only start from a point or an edge'.format(start))
 	intersections = set()
 	seen = set()
+	sides = {}	# signed distance of points to the cutplane, shared by the faces around each point
 	while front:
 		# propagation affairs
 		frontedge = front.pop()
@@ -170,8 +175,26 @@ def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
 				front.append((f[j],f[j-1]))
 			continue
 		
+		# the face points are fetched once for all the tests below
+		fpts = mesh.facepoints(f)
+		
+		# point side for propagation
+		# True if the point is over or on the cutplane
+		side = [0.]*3
+		for j,pi in enumerate(f):
+			s = sides.get(pi)
+			if s is None:
+				s = sides[pi] = dot(fpts[j]-cutplane[0], cutplane[1])
+			side[j] = s
+		goodside = [s >= -prec	for s in side]
+		
+		# abort conditions
+		# a face entirely under the cutplane cannot reach the axis on it, so reject it before the intersections
+		if not any(goodside):
+			seen.add(fi)
+			continue
+		
 		# find the intersection of the triangle with the common axis to the cutplane and the stop plane
-		fpts = mesh.facepoints(fi)
 		p = None
 		for a in axis:
 			# if the intersection is on a triangle's edge, p is None
@@ -196,32 +219,20 @@ def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
 		# mark this face as processed
 		seen.add(fi)
 		
-		# point side for propagation
-		# True if the point is over or on the cutplane
-		goodside = [False]*3
-		for j,pi in enumerate(f):
-			goodside[j] = 	dot(pts[pi]-cutplane[0], cutplane[1]) >= -prec
-		
-		# abort conditions
-		if not any(goodside):
-			continue
-		outside = any( all( dot(pts[pi]-stop[0], stop[1]) <= -prec
-							for pi in f)
+		outside = any( all( dot(p-stop[0], stop[1]) <= -prec
+							for p in fpts)
 						for stop in stops)
 		if outside:
 			continue
 		
 		# True if the point is over or on for all stop planes
 		goodx = [False]*3
-		for j,pi in enumerate(f):
-			goodx[j] = all(dot(pts[pi]-stop[0], stop[1]) >= -prec  	for stop in stops)
+		for j,p in enumerate(fpts):
+			goodx[j] = all(dot(p-stop[0], stop[1]) >= -prec  	for stop in stops)
 			
 		
 		# intersections of triangle's edges with the plane
-		cut = [None]*3
-		for j in range(3):
-			cut[j] = intersection_edge_plane((pts[f[j]], pts[f[j-2]]), cutplane, prec)
-			
+		cut = intersection_face_plane(fpts, cutplane, prec)
 		
 		# don't intersect if the 2 points are at the corner of the triangle
 		for j in range(3):
@@ -256,7 +267,7 @@ def mesh_cut(mesh, start, cutplane, stops, conn, prec, removal, cutghost=True):
 					registerface(mesh, conn, l+1)
 					seen.update((fi, l, l+1))
 					# mark to remove the faces outside
-					if dot(pts[f[j]]-cutplane[0], cutplane[1]) < 0:
+					if side[j] < 0:
 						removal.add(fi)
 						removal.add(l)
 						intersections.add((p2,p1))
@@ -344,13 +355,20 @@ def mesh_edgecut(mesh, edges, conn=None, prec=None, removal=None, **cutter):
 			separators[(i,prox[0])] = None
 			separators[(i,prox[1])] = None
 	# fix the missing separators in case of straight lines
+	# all the junctions crossed while walking the line get the separator found at its end
 	for e,sep in separators.items():
+		if sep:	continue
+		walk = [e]
 		i,j = e
 		while not sep:
 			prox = juncconn[i]
 			if len(prox) != 2:	raise MeshError('unable to compute all separators')
 			j,i = i, prox[0] if prox[0] != j else prox[1]
-			separators[e] = sep = separators[(i,j)]
+			if (i,j) not in separators or (i,j) == e:	raise MeshError('unable to compute all separators')
+			sep = separators[(i,j)]
+			walk.append((i,j))
+		for k in walk:
+			separators[k] = sep
 	
 	corners = {}	# offset pour chaque coin
 	# pour chaque jonction
@@ -384,18 +402,20 @@ def mesh_edgecut(mesh, edges, conn=None, prec=None, removal=None, **cutter):
 			separators[(junc,p)] = plane
 	
 	outlines = {}
+	# the points hashing is built once for all the cuts
+	ptmgr = hashing.PointSet(prec, manage=pts)
 	# couper les aretes
 	for edge, offset in offsets.items():
 		outlines[edge] = mesh_cut(mesh, edge, 
 								(pts[edge[0]]+offset, -normalize(offset)), 
 								(separators.get(edge), separators.get((edge[1], edge[0]))), 
-								conn, prec, removal, True)
+								conn, prec, removal, True, ptmgr)
 	# couper les sommets
 	for corner,offset in corners.items():
 		outlines[corner] = mesh_cut(mesh, corner, 
 								(pts[corner]+offset, -normalize(offset)), 
 								(),
-								conn, prec, removal, False)
+								conn, prec, removal, False, ptmgr)
 	if final:
 		frontier = []
 		for edges in outlines.values():
@@ -427,7 +447,9 @@ def finalize(mesh, outlines, removal, prec):
 			)
 	
 	# delete inside faces and empty ones
-	removefaces(mesh, lambda fi: fi in removal or faceheight(mesh,fi) <= prec)
+	mask = faceheights(mesh) <= prec
+	mask[np.fromiter(removal, np.intp, len(removal))] = True
+	removefaces(mesh, mask)
 
 def arrangeface(f, p):
 	if   p == f[1]:	return f[1],f[2],f[0]
@@ -435,16 +457,16 @@ def arrangeface(f, p):
 	else:			return f
 
 def registerface(mesh, conn, fi):
-	f = mesh.faces[fi]
-	if f[0] == f[1] or f[1] == f[2] or f[2] == f[0]:
+	a,b,c = mesh.faces[fi]
+	if a == b or b == c or c == a:
 		return
-	for e in ((f[0],f[1]), (f[1],f[2]), (f[2],f[0])):
-		conn[e] = fi
+	conn[(a,b)] = conn[(b,c)] = conn[(c,a)] = fi
 		
 def unregisterface(mesh, conn, fi):
-	f = mesh.faces[fi]
-	for e in ((f[0],f[1]), (f[1],f[2]), (f[2],f[0])):
-		if e in conn:	del conn[e]
+	a,b,c = mesh.faces[fi]
+	conn.pop((a,b), None)
+	conn.pop((b,c), None)
+	conn.pop((c,a), None)
 
 def segmentsdict(line):
 	segments = {}
@@ -456,63 +478,35 @@ def intersection_plane_plane(p0, p1, neigh=None):
 	''' Return the intersection axis between two planes '''
 	if not neigh:	neigh = p0[0]
 	d = cross(p0[1], p1[1])
-	if length(d) <= NUMPREC:	return None
-	return vec3(
-		inverse(transpose(dmat3(p0[1], p1[1], d))) 
-		* dvec3(dot(p0[0],p0[1]), dot(p1[0],p1[1]), dot(neigh,d))
-		), normalize(d)
-
-def intersection_edge_plane(edge, axis, prec):
-	''' Return the intersection point of an edge with a plane, or None if it doesn't exist 
-		In case of an intersection at an extremity of the edge, return that edge point
-	'''
-	a, b = edge
-	da = dot(axis[0]-a, axis[1])
-	db = dot(axis[0]-b, axis[1])
-	if abs(da) <= prec:		return a
-	if abs(db) <= prec:		return b
-	if da * db > 0:		return None		# the segment doesn't reach the plane
-	edgedir = b-a
-	proj = dot(edgedir, axis[1])
-	if abs(proj) <= prec:	return None	# the segment is parallel to the plane
-	return a + da * edgedir / proj
-
-def intersection_axis_face(axis, face, prec):
-	''' Intersection between an axis and a triangle
-		In case of intersection with an edge of the triangle, return None
-	'''
-	n = cross(face[1]-face[0], face[2]-face[0])
-	unp = dot(n, axis[1])
-	if abs(unp) <= prec:	return None
-	p = axis[0] + dot(face[0]-axis[0], n) / unp * axis[1]
-	for i in range(3):
-		if dot(p - face[i], normalize(cross(n,face[i]-face[i-1]))) <= prec:
-			return None
-	return p
+	d2 = dot(d,d)
+	if d2 <= NUMPREC**2:	return None
+	# solve the system of the 3 planes (the 2 given and the one orthogonal to d passing by neigh) with Cramer's rule
+	# as d = cross(p0[1], p1[1]), the determinant is simply dot(d,d)
+	# this rounds differently from a matrix inversion, so the quad diagonals chosen at ties by the bevels may change accordingly
+	return (
+			dot(p0[0],p0[1]) * cross(p1[1], d) 
+		+	dot(p1[0],p1[1]) * cross(d, p0[1]) 
+		+	dot(neigh,d) * d
+		) / d2, d * (1/sqrt(d2))	# same operations as normalize()
 
 
 
 def removefaces(mesh, crit):
-	''' Remove faces whose indices are present in faces, (for huge amount, prefer pass faces as a set) '''
-	newfaces = typedlist(dtype=uvec3)
-	newtracks = typedlist(dtype='I')
-	for i in range(len(mesh.faces)):
-		if not crit(i):
-			newfaces.append(mesh.faces[i])
-			newtracks.append(mesh.tracks[i])
-	mesh.faces = newfaces
-	mesh.tracks = newtracks
+	''' Remove faces for which `crit(index)` is True, crit can also be a boolean mask over the faces '''
+	keep = ~removalmask(crit, len(mesh.faces))
+	mesh.faces = numpy_to_typedlist(typedlist_to_numpy(mesh.faces, 'u4')[keep], uvec3)
+	mesh.tracks = typedlist(typedlist_to_numpy(mesh.tracks, 'u4')[keep], dtype='I')
 	
 def removeedges(mesh, crit):
-	''' Remove faces whose indices are present in faces, (for huge amount, prefer pass faces as a set) '''
-	newedges = typedlist(dtype=uvec2)
-	newtracks = typedlist(dtype='I')
-	for i in range(len(mesh.edges)):
-		if not crit(i):
-			newedges.append(mesh.edges[i])
-			newtracks.append(mesh.tracks[i])
-	mesh.edges = newedges
-	mesh.tracks = newtracks
+	''' Remove edges for which `crit(index)` is True, crit can also be a boolean mask over the edges '''
+	keep = ~removalmask(crit, len(mesh.edges))
+	mesh.edges = numpy_to_typedlist(typedlist_to_numpy(mesh.edges, 'u4')[keep], uvec2)
+	mesh.tracks = typedlist(typedlist_to_numpy(mesh.tracks, 'u4')[keep], dtype='I')
+	
+def removalmask(crit, n):
+	if callable(crit):
+		return np.fromiter(map(crit, range(n)), bool, n)
+	return np.asarray(crit, bool)
 
 #def facesurf(mesh, fi):
 	#o,x,y = mesh.facepoints(fi)
@@ -535,10 +529,26 @@ def faceheight(mesh, fi):
 	f = mesh.facepoints(fi)
 	m = inf
 	for i in range(3):
-		l = length(f[i-2]-f[i])
+		u = f[i-2]-f[i]
+		l = dot(u,u)
 		if not l:	return 0
-		h = length(cross(f[i-2]-f[i], f[i-1]-f[i])) / l
+		h = length2(cross(u, f[i-1]-f[i])) / l
 		if h < m:	m = h
+	# the minimum is searched on squared heights, so there is only one square root
+	return sqrt(m)
+	
+def faceheights(mesh):
+	''' same as `faceheight` for all the faces at once, as a numpy array '''
+	f = typedlist_to_numpy(mesh.points, 'f8')[typedlist_to_numpy(mesh.faces, 'u4')]
+	m = np.full(len(f), inf)
+	empty = np.zeros(len(f), bool)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		for i in range(3):
+			u = f[:,i-2] - f[:,i]
+			l = np.linalg.norm(u, axis=1)
+			empty |= l == 0
+			m = np.fmin(m, np.linalg.norm(np.cross(u, f[:,i-1] - f[:,i]), axis=1) / l)
+	m[empty] = 0
 	return m
 
 
@@ -663,15 +673,8 @@ def mesh_filet(mesh, edges, resolution=None, **cutter):
 			# match the curves
 			r.reverse()
 			match = list(match_length(Wire(pts,l), Wire(pts,r)))
-			# prepare tangents
-			ll = Wire(pts,l).length()
-			x = 0.
-			for i in range(len(match)):
-				if i:	x += distance(pts[match[i-1][0]], pts[match[i][0]]) / ll
-				# get the tangents from the triangle between the cuts and the cutting edge
-				l,r = match[i]
-				o = interpol1(pts[e[1]], pts[e[0]], x)
-				plane = cross(pts[r]-o, pts[l]-o)
+			# prepare tangents from the faces adjacent to the cutted edge
+			for l,r in match:
 				normals[l] = enormals[e][1] + normals.get(l, 0)
 				normals[r] = enormals[e][0] + normals.get(r, 0)
 			junctions.append(match)
@@ -714,7 +717,6 @@ def mesh_filet(mesh, edges, resolution=None, **cutter):
 		new += tangentcorner(pts, lp, normals, div)
 	# fill gap between existing surface and round extremities
 	for edge in ends:
-		n = mesh.facenormal(conn[(edge[1],edge[0])])
 		new += tangentend(pts, edge, normals, div)
 	# round cutted edges
 	for match in junctions:
@@ -442,9 +442,20 @@ def intersect_edges(e1: '(vec3,vec3)', e2: '(vec3,vec3)', prec) -> vec3:
 
 	
 	
-def cut_web_mesh(w1: Web, ref: Mesh, prec=None) -> '(Web, Wire)':
+def faces_map(ref: Mesh) -> PositionMap:
+	''' Spacial hashing of the faces of `ref`, as used to find the intersection candidates.
+		It only depends on `ref`, so it can be computed once and passed to successive cuts against the same mesh.
+	'''
+	prox = PositionMap(meshcellsize(ref))
+	for f in range(len(ref.faces)):
+		prox.add(ref.facepoints(f), f)
+	return prox
+
+def cut_web_mesh(w1: Web, ref: Mesh, prec=None, prox=None) -> '(Web, Wire)':
 	''' Cut the web inplace at its intersections with the `ref` web.
 	
+		`prox` is the result of `faces_map(ref)`, computed if not provided
+	
 		Return:
 		
 			`(cutted, frontier)`
@@ -454,9 +465,7 @@ def cut_web_mesh(w1: Web, ref: Mesh, prec=None) -> '(Web, Wire)':
 	
 	# topology informations for optimization
 	points = PointSet(prec, manage=w1.points)
-	prox = PositionMap(meshcellsize(ref))
-	for f in range(len(ref.faces)):
-		prox.add(ref.facepoints(f), f)
+	if prox is None:	prox = faces_map(ref)
 	conn = connpe(w1.edges)
 	
 	mn = Web(w1.points, groups=w1.groups)  # resulting web
@@ -506,11 +515,11 @@ def cut_web_mesh(w1: Web, ref: Mesh, prec=None) -> '(Web, Wire)':
 	return mn, frontier
 	
 					
-def pierce_web_mesh(w1: Web, ref: Mesh, side=False, prec=None) -> Web:
+def pierce_web_mesh(w1: Web, ref: Mesh, side=False, prec=None, prox=None) -> Web:
 
 	if not prec:	prec = w1.precision()
 	
-	w1, frontier = cut_web_mesh(w1, ref, prec)
+	w1, frontier = cut_web_mesh(w1, ref, prec, prox)
 	conn = connpe(w1.edges)			# connectivity
 	stops = set(frontier.indices)	# propagation stop points
 	
@@ -580,7 +589,7 @@ pierce_ops = {
 	(Web,Web):		pierce_web,
 	(Web,Mesh):		pierce_web_mesh,
 	}
-def pierce(m, ref, side=False, prec=None):
+def pierce(m, ref, side=False, prec=None, **kwargs):
 	''' Cut a web/mesh and remove its parts considered inside the `ref` shape
 		
 		Overloads:
@@ -595,11 +604,13 @@ def pierce(m, ref, side=False, prec=None):
 	
 		 - False keeps the exterior part (part exclusive to the other mesh)
 		 - True keeps the interior part (the common part)
+		
+		Additional keyword arguments are passed to the overload, such as `prox=faces_map(ref)` for `pierce(Web, Mesh)` when cutting many webs with the same mesh
 	'''
 	op = pierce_ops.get((type(m), type(ref)))
 	if not op:
 		raise TypeError('pierce is not possible between {} and {}'.format(type(m).__name__, type(ref).__name__))
-	return op(m, ref, side, prec)
+	return op(m, ref, side, prec, **kwargs)
 
 
 boolean_ops = {
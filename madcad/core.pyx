@@ -63,6 +63,8 @@ cdef:
 		return cvec3(a.x-b.x, a.y-b.y, a.z-b.z)
 	cvec3 vmul(cvec3 v, double r):
 		return cvec3(r*v.x, r*v.y, r*v.z)
+	cvec3 vdiv(cvec3 v, double r):
+		return cvec3(v.x/r, v.y/r, v.z/r)
 	double length(cvec3 v):
 		return sqrt(dot(v,v))
 	double norminf(cvec3 v):
@@ -436,3 +438,73 @@ def intersect_triangles(f0, f1, precision):
 	raise Exception("unexpected case: {} {}".format(repr(fA), repr(fB)))
 
 
+
+
+cdef int edge_plane(cvec3 a, cvec3 b, cvec3 o, cvec3 n, double prec, cvec3 *r):
+	''' intersection of an edge with a plane, return 0 if there is no intersection, 1 or 2 if it is one of the edge extremities, and 3 if it is `r` '''
+	cdef double da, db, proj
+	cdef cvec3 edgedir
+	
+	da = dot(vsub(o,a), n)
+	db = dot(vsub(o,b), n)
+	if fabs(da) <= prec:	return 1
+	if fabs(db) <= prec:	return 2
+	if da * db > 0:		return 0		# the segment doesn't reach the plane
+	edgedir = vsub(b,a)
+	proj = dot(edgedir, n)
+	if fabs(proj) <= prec:	return 0	# the segment is parallel to the plane
+	# same operation order as the python version, for bit identical results
+	r[0] = vadd(a, vdiv(vmul(edgedir, da), proj))
+	return 3
+
+def intersection_edge_plane(edge, axis, double prec):
+	''' Return the intersection point of an edge with a plane, or None if it doesn't exist 
+		In case of an intersection at an extremity of the edge, return that edge point
+	'''
+	cdef cvec3 r
+	cdef int found = edge_plane(glm2c(edge[0]), glm2c(edge[1]), glm2c(axis[0]), glm2c(axis[1]), prec, &r)
+	if found == 1:	return edge[0]
+	if found == 2:	return edge[1]
+	if found == 3:	return c2glm(r)
+	return None
+
+def intersection_face_plane(face, axis, double prec):
+	''' Return the intersections of the 3 edges of a face with a plane, as a list where item `j` is the intersection with the edge `(face[j], face[j-2])` or None
+		In case of an intersection at an extremity of an edge, the item is that edge point
+	'''
+	cdef cvec3[3] f = [glm2c(face[0]), glm2c(face[1]), glm2c(face[2])]
+	cdef cvec3 o = glm2c(axis[0])
+	cdef cvec3 n = glm2c(axis[1])
+	cdef cvec3 r
+	cdef int j, k, found
+	
+	cut = [None]*3
+	for j in range(3):
+		k = (j+1)%3
+		found = edge_plane(f[j], f[k], o, n, prec, &r)
+		if found == 1:		cut[j] = face[j]
+		elif found == 2:	cut[j] = face[k]
+		elif found == 3:	cut[j] = c2glm(r)
+	return cut
+
+def intersection_axis_face(axis, face, double prec):
+	''' Intersection between an axis and a triangle
+		In case of intersection with an edge of the triangle, return None
+	'''
+	cdef cvec3 o = glm2c(axis[0])
+	cdef cvec3 d = glm2c(axis[1])
+	cdef cvec3[3] f = [glm2c(face[0]), glm2c(face[1]), glm2c(face[2])]
+	cdef cvec3 n, p, t
+	cdef double unp
+	cdef size_t i
+	
+	n = cross(vsub(f[1],f[0]), vsub(f[2],f[0]))
+	unp = dot(n, d)
+	if fabs(unp) <= prec:	return None
+	p = vaffine(o, d, dot(vsub(f[0],o), n) / unp)
+	for i in range(3):
+		t = cross(n, vsub(f[i], f[(i+2)%3]))
+		# the sign is enough to reject the points outside, the normalization is only needed for the precision margin
+		if dot(vsub(p, f[i]), t) < 0 or dot(vsub(p, f[i]), normalize(t)) <= prec:
+			return None
+	return c2glm(p)
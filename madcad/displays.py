@@ -8,7 +8,7 @@ from .common import resourcedir
 from . import settings
 from . import primitives
 from PIL import Image
-import numpy.core as np
+import numpy as np
 import moderngl as mgl
 
 from PyQt5.QtCore import Qt, QEvent
@@ -332,8 +332,8 @@ class WebDisplay(Display):
 class Vertices(object):
 	''' convenient class to share vertices between SolidDisplay, WebDisplay, PointsDisplay '''
 	def __init__(self, ctx, positions, idents):
-		self.idents = idents
-		self.nident = int(max(idents))+1
+		self.idents = np.asarray(idents)
+		self.nident = int(self.idents.max())+1
 		self.flags = np.zeros(len(positions), dtype='u1')
 		self.flags_updated = False
 		assert len(idents) == len(positions)
@@ -353,8 +353,7 @@ class Vertices(object):
 			self.flags_updated = False
 	
 	def selectsub(self, sub):
-		for i,id in enumerate(self.idents):
-			self.flags[i] ^= id == sub
+		self.flags ^= self.idents == sub
 		self.flags_updated = True
 			
 
@@ -33,7 +33,7 @@
 '''
 
 from .mathutils import *
-from .mesh import Web, Wire, Mesh, web, wire
+from .mesh import Web, Wire, Mesh, web, wire, numpy_to_typedlist, typedlist_to_numpy
 from .blending import junction, blendpair
 from .generation import extrusion, revolution, repeat, extrans
 from .primitives import Circle, ArcCentered, Segment
@@ -50,6 +50,7 @@ from functools import reduce, partial
 from operator import add
 from copy import copy
 from madcad.mathutils import COMPREC
+import numpy as np
 
 
 
@@ -76,13 +77,14 @@ def rackprofile(step, height=None, offset=0, asymetry=None, alpha=radians(20), r
 		a = -0.1*h
 	ta = tan(alpha)
 	x = 0.5 - 2*e/step*ta  # fraction of the tooth above the primitive circle
+	top, bottom = h-e-a, -h-e-a		# heights of the tooth extremities
 	
 	return Wire([
-		vec3(step*x/2 - ta * ( h-e-a),   h-e-a,  0),
-		vec3(step*x/2 - ta * (-h-e-a),  -h-e-a,  0),
-		vec3(step*(2-x)/2 + ta * (-h-e-a),  -h-e-a,  0),
-		vec3(step*(2-x)/2 + ta * ( h-e-a),   h-e-a,  0),
-		vec3(step*(2+x)/2 - ta * ( h-e-a),   h-e-a,  0),
+		vec3(step*x/2 - ta*top,  top,  0),
+		vec3(step*x/2 - ta*bottom,  bottom,  0),
+		vec3(step*(2-x)/2 + ta*bottom,  bottom,  0),
+		vec3(step*(2-x)/2 + ta*top,  top,  0),
+		vec3(step*(2+x)/2 - ta*top,  top,  0),
 		], groups=['rack'])
 
 
@@ -166,18 +168,12 @@ def gearprofile(step, teeth, height=None, offset=0, asymetry=None, alpha=radians
 	t0 = place + o0	# start of contact curve
 	ti = place + oi	# start of interference curve
 	# contact line
-	for i in range(n+1):
-		t = interpol1(t0-l0, t0-s0, i/n)
-		v = involute(c, t0, t)
-		points.append(vec3(v,0))
-		tracks.append(0)
+	points.append(involutes(c, t0, 0, np.linspace(t0-l0, t0-s0, n+1)))
+	tracks.extend([0]*(n+1))
 	# interference line
 	if interference:
-		for i in range(n+1):
-			t = interpol1(ti+li, ti, i/n)
-			v = involuteof(p, ti, -h+e+a, t)
-			points.append(vec3(v,0))
-			tracks.append(1)
+		points.append(involutes(p, ti, -h+e+a, np.linspace(ti+li, ti, n+1)))
+		tracks.extend([1]*(n+1))
 	
 	tracks[-1] = 2
 	
@@ -187,20 +183,15 @@ def gearprofile(step, teeth, height=None, offset=0, asymetry=None, alpha=radians
 	ti = place - oi
 	# interference line
 	if interference:
-		for i in range(n+1):
-			t = interpol1(ti, ti-li, i/n)
-			v = involuteof(p, ti, -h+e+a, t)
-			points.append(vec3(v,0))
-			tracks.append(3)
+		points.append(involutes(p, ti, -h+e+a, np.linspace(ti, ti-li, n+1)))
+		tracks.extend([3]*(n+1))
 	# contact line
-	for i in range(n+1):
-		t = interpol1(t0+s0, t0+l0, i/n)
-		v = involute(c, t0, t)
-		points.append(vec3(v,0))
-		tracks.append(4)
+	points.append(involutes(c, t0, 0, np.linspace(t0+s0, t0+l0, n+1)))
+	tracks.extend([4]*(n+1))
 		
 	tracks[-1] = 5
 
+	points = numpy_to_typedlist(np.concatenate(points), vec3)
 	points.append(angleAxis(step/p, vec3(0,0,1)) * points[0])
 	tracks.append(5)
 
@@ -225,9 +216,8 @@ def involute(c, t0, t):
 
 		`t` and `t0` are angular positions
 	'''
-	x = vec2(cos(t), sin(t))
-	y = vec2(-x[1], x[0])
-	return c*(x + y*(t0-t))
+	x, y = cos(t), sin(t)
+	return vec2(c*(x - y*(t0-t)), c*(y + x*(t0-t)))
 
 def involuteat(c, r):
 	''' give the parameter for the involute of circle radius `c` to reach radius `r` '''
@@ -238,9 +228,14 @@ def involuteof(c, t0, d, t):
 
 		`t` and `t0` are angular positions
 	'''
-	x = vec2(cos(t), sin(t))
-	y = vec2(-x[1], x[0])
-	return (c+d)*x + c*y*(t0-t)
+	x, y = cos(t), sin(t)
+	return vec2((c+d)*x - c*y*(t0-t), (c+d)*y + c*x*(t0-t))
+
+
+def involutes(c, t0, d, t):
+	''' same as `involuteof` but for an array of parameters `t`, returning an array of points in the plane XY '''
+	x, y = np.cos(t), np.sin(t)
+	return np.stack([(c+d)*x - c*y*(t0-t), (c+d)*y + c*x*(t0-t), np.zeros(len(t))], axis=1)
 
 
 def angle(p):
@@ -532,12 +527,8 @@ def pattern_rounded(
 
 
 def minmax_radius(points):
-	min, max = inf, 0
-	for p in points:
-		r = length2(vec2(p))
-		if r > max:		max = r
-		elif r < min:	min = r
-	return sqrt(min), sqrt(max)
+	r = np.linalg.norm(typedlist_to_numpy(points, 'f8')[:,:2], axis=1)
+	return r.min(initial=inf), r.max(initial=0)
 
 
 
@@ -1182,9 +1173,16 @@ def cone_projection(profile: Wire, pitch_cone_angle:float) -> Wire:
 		profile (Wire) : 			the spherical profile
 		pitch_cone_angle (float) : 	the pitch cone angle
 	"""
-	ref = lambda t: vec3(sin(pitch_cone_angle) * cos(t), sin(pitch_cone_angle) * sin(t), cos(pitch_cone_angle))
-	new_points = [1 / dot(ref(atan2(point.y, point.x)), point) * point for point in profile.points]
-	return Wire(new_points, indices=profile.indices)
+	# all points are projected at once, the cone direction at each point only depends on its angular position
+	points = typedlist_to_numpy(profile.points, 'f8')
+	t = np.arctan2(points[:,1], points[:,0])
+	ref = np.stack([
+		sin(pitch_cone_angle) * np.cos(t), 
+		sin(pitch_cone_angle) * np.sin(t), 
+		np.full(len(t), cos(pitch_cone_angle)),
+		], axis=1)
+	new_points = points / np.sum(ref * points, axis=1)[:,None]
+	return Wire(numpy_to_typedlist(new_points, vec3), indices=profile.indices)
 
 # @cachefunc
 def bevelgear(
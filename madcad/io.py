@@ -2,12 +2,13 @@
 
 import numpy as np
 import numpy.lib.recfunctions as rfn
-import os, tempfile
+import os, tempfile, struct, threading
 from functools import wraps
-from hashlib import md5
+from inspect import CO_VARARGS, CO_VARKEYWORDS
+from hashlib import blake2b
 
-from .mathutils import vec3, glm, inf, typedlist
-from .mesh import Mesh, Wire
+from .mathutils import *
+from .mesh import Mesh, Web, Wire, numpy_to_typedlist, typedlist_to_numpy
 
 class FileFormatError(Exception):	pass
 
@@ -52,19 +53,31 @@ def cache(filename: str, create: callable=None, name=None, storage=None, **opts)
 	if not storage:	storage = caches
 	if not name:	name = filename
 	
-	# create the cache file if it doesn't exist
-	if os.path.exists(filename):
-		cachedate = storage[name][0] if name in storage else -inf
+	# a single stat tells both whether the file exists and its date
+	try:
 		filedate = os.path.getmtime(filename)
-		if cachedate < filedate:
-			storage[name] = (filedate, read(filename, **opts))
+	except FileNotFoundError:
+		filedate = None
 	# load reload the file content if it's newer that the data in memory
+	if filedate is not None:
+		if name not in storage or storage[name][0] < filedate:
+			storage[name] = (filedate, read(filename, **opts))
+	# create the cache file if it doesn't exist
 	else:
 		if name in storage:	obj = storage[name][1]
 		elif create:		obj = create()
 		else:
 			raise IOError("the cache file doesn't exist")
-		write(obj, filename, **opts)
+		# write to a temporary file first, so a crash or a concurrent reader never sees an incomplete file
+		base, ext = os.path.splitext(filename)
+		tmp = '{}.{}-{}.tmp{}'.format(base, os.getpid(), threading.get_ident(), ext)
+		try:
+			write(obj, tmp, **opts)
+			os.replace(tmp, filename)
+		except:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+			raise
 		storage[name] = (os.path.getmtime(filename), obj)
 	return storage[name][1]
 	
@@ -75,25 +88,112 @@ def cachefunc(f):
 		
 		Use it if you want to cache their result associated with the argument set used 
 	'''
-	@wraps(f)
-	def repl(*args, **kwargs):
-		if not os.path.exists(cachedir):
-			os.makedirs(cachedir)
-		key = '{}/{}{}-{}.pickle'.format(
-			cachedir,
+	# the function part of the cache file names does not change between calls
+	prefix = '/{}{}-'.format(
 			f.__module__ + '.' if f.__module__ else '',
 			f.__name__,
-			hex(int.from_bytes(
-				md5(repr((
-					*args, 
-					sorted(list(kwargs.items()))
-					)).encode())
-					.digest(),
-				'little')),
 			)
-		return cache(key, lambda: f(*args, **kwargs))
+	pack = argspacker(f)
+	@wraps(f)
+	def repl(*args, **kwargs):
+		h = blake2b(digest_size=16)
+		hashargs(h, pack(args, kwargs))
+		key = cachedir + prefix + h.hexdigest() + '.pickle'
+		results = []
+		def create():
+			results.append(f(*args, **kwargs))
+			return results[0]
+		try:
+			return cache(key, create)
+		except FileNotFoundError:
+			# the cache directory is only created when found missing, instead of checking it before each call
+			# an error raised by f itself is not retried
+			if not results or os.path.isdir(cachedir):	raise
+		os.makedirs(cachedir, exist_ok=True)
+		return cache(key, lambda: results[0])
 	return repl
 
+def argspacker(f):
+	''' Return a function packing the call arguments of `f` in a canonical tuple, 
+		so that equivalent calls like `f(1, 2)`, `f(1, b=2)` or `f(1)` with `b=2` as default give the same cache key.
+		
+		The signature is analysed once here instead of on each call. 
+		Functions with variable or keyword-only arguments, and calls not matching the signature, are packed as `(args, sorted kwargs)`
+	'''
+	def generic(args, kwargs):
+		# keywords order doesn't matter, sorting them is only needed when there is several
+		return (args, sorted(kwargs.items()) if len(kwargs) > 1 else tuple(kwargs.items()))
+	
+	code = getattr(f, '__code__', None)
+	if not code or code.co_flags & (CO_VARARGS | CO_VARKEYWORDS) or code.co_kwonlyargcount or code.co_posonlyargcount:
+		return generic
+	names = code.co_varnames[:code.co_argcount]
+	defaults = f.__defaults__ or ()
+	required = len(names) - len(defaults)
+	
+	def pack(args, kwargs):
+		if len(args) >= len(names):
+			if len(args) == len(names) and not kwargs:
+				return args
+			return generic(args, kwargs)
+		values = list(args)
+		used = 0
+		for i in range(len(args), len(names)):
+			if names[i] in kwargs:	
+				values.append(kwargs[names[i]])
+				used += 1
+			elif i >= required:		values.append(defaults[i-required])
+			else:					return generic(args, kwargs)
+		# unknown or duplicated keywords are left for the function to complain about
+		if used != len(kwargs):
+			return generic(args, kwargs)
+		return tuple(values)
+	return pack
+
+glmtypes = (vec2, vec3, vec4, mat2, mat3, mat4, quat, ivec2, ivec3, ivec4, uvec2, uvec3, uvec4)
+glmnames = {
+	**{t.__name__: t  for t in glmtypes},
+	'vec2':vec2, 'vec3':vec3, 'vec4':vec4, 'mat2':mat2, 'mat3':mat3, 'mat4':mat4, 'quat':quat,
+	}
+
+def hashargs(h, obj):
+	''' Feed the hash object `h` with a canonical binary form of `obj`, 
+		without building the intermediate repr string of the whole arguments tree 
+	'''
+	if obj is None or isinstance(obj, bool):
+		h.update(b'n' if obj is None else b'b1' if obj else b'b0')
+	elif isinstance(obj, int) and -(1<<63) <= obj < 1<<63:
+		h.update(b'i')
+		h.update(struct.pack('<q', obj))
+	elif isinstance(obj, float):
+		h.update(b'f')
+		h.update(struct.pack('<d', obj))
+	elif isinstance(obj, str):
+		data = obj.encode()
+		h.update(struct.pack('<cQ', b's', len(data)))
+		h.update(data)
+	elif isinstance(obj, (tuple, list)):
+		h.update(struct.pack('<cQ', b'l', len(obj)))
+		for item in obj:
+			hashargs(h, item)
+	elif isinstance(obj, glmtypes):
+		h.update(type(obj).__name__.encode())
+		h.update(bytes(obj))
+	elif isinstance(obj, np.ndarray):
+		h.update(struct.pack('<cQ', b'a', obj.ndim))
+		h.update(obj.dtype.str.encode())
+		h.update(struct.pack('<{}Q'.format(obj.ndim), *obj.shape))
+		h.update(np.ascontiguousarray(obj).view(np.uint8))
+	elif isinstance(obj, typedlist):
+		data = memoryview(obj)
+		h.update(struct.pack('<cQ', b't', len(obj)))
+		h.update(data.format.encode())
+		h.update(data.cast('B'))
+	else:
+		data = repr(obj).encode()
+		h.update(struct.pack('<cQ', b'r', len(data)))
+		h.update(data)
+
 	
 '''
 	pickle files are the standard python serialized files, they are absolutely not secure ! so do not use it for something else than your own caching.
@@ -101,112 +201,113 @@ def cachefunc(f):
 import pickle
 
 def pickle_read(file, **opts):
-	return pickle.load(open(file, 'rb'))
+	with open(file, 'rb', buffering=1<<20) as f:
+		return pickle.load(f)
 	
 def pickle_write(obj, file, **opts):
-	return pickle.dump(obj, open(file, 'wb'))
+	# protocol 5 is not used because typedlists then dump their whole reserved buffer, making files much bigger
+	with open(file, 'wb', buffering=1<<20) as f:
+		return pickle.dump(obj, f, protocol=opts.get('protocol', 4))
 
 '''
 	PLY is loaded using plyfile module 	https://github.com/dranjan/python-plyfile
 	using the specifications from 	https://web.archive.org/web/20161221115231/http://www.cs.virginia.edu/~gfx/Courses/2001/Advanced.spring.01/plylib/Ply.txt
 		(also locally available in ply-description.txt)
 '''
-try:
-	from plyfile import PlyData, PlyElement
-except ImportError:	pass
-else:
+def ply_read(file, **opts):
+	from plyfile import PlyData
 	from . import triangulation
-
-	def ply_read(file, **opts):
-		mesh = Mesh()
-		
-		data = PlyData.read(file)
-		if 'vertex' not in data:	raise FileFormatError('file must have a vertex buffer')
-		if 'face' not in data:		raise FileFormatError('file must have a face buffer')
-		
-		# collect points
-		mesh.points = typedlist(data['vertex'].data.astype('f8, f8, f8'), dtype=vec3)
-		
-		# collect faces
-		faces = data['face'].data
-		if faces.dtype.names[0] == 'vertex_indices':
-			for face in faces['vertex_indices']:
+	
+	mesh = Mesh()
+	
+	data = PlyData.read(file)
+	if 'vertex' not in data:	raise FileFormatError('file must have a vertex buffer')
+	if 'face' not in data:		raise FileFormatError('file must have a face buffer')
+	
+	# collect points
+	mesh.points = typedlist(data['vertex'].data.astype('f8, f8, f8'), dtype=vec3)
+	
+	# collect faces
+	faces = data['face'].data
+	if faces.dtype.names[0] == 'vertex_indices':
+		indices = faces['vertex_indices']
+		# fast path for triangle-only files, the most common case
+		if len(indices) and (np.fromiter(map(len, indices), dtype=np.intp, count=len(indices)) == 3).all():
+			mesh.faces = numpy_to_typedlist(np.concatenate(indices).astype('u4').reshape(-1,3), dtype=uvec3)
+		else:
+			for face in indices:
 				#print('  ', type(face), face, face.dtype, face.strides)
 				if len(face) == 3:	# triangle
 					mesh.faces.append(face)
 				elif len(face) > 3:	# quad or other extended face
 					mesh += triangulation.triangulation_outline(Wire(mesh.points, face))
-		else:
-			mesh.faces = numpy_to_typedlist(faces.astype('u4'), dtype=uvec3)
+	else:
+		mesh.faces = numpy_to_typedlist(faces.astype('u4'), dtype=uvec3)
 
-		# collect tracks
-		if 'group' in faces.dtype.names:
-			mesh.tracks = typedlist(faces['group'].astype('u4'), dtype='I')
-		else:
-			mesh.tracks = typedlist.full(0, len(mesh.faces), 'I')
-		
-		# create groups  (TODO find a way to get it from the file, PLY doesn't support non-scalar types)
-		mesh.groups = [None] * (max(mesh.tracks, default=-1)+1)
-		
-		return mesh
+	# collect tracks
+	if 'group' in faces.dtype.names:
+		mesh.tracks = typedlist(faces['group'].astype('u4'), dtype='I')
+	else:
+		mesh.tracks = typedlist.full(0, len(mesh.faces), 'I')
+	
+	# create groups  (TODO find a way to get it from the file, PLY doesn't support non-scalar types)
+	mesh.groups = [None] * (max(mesh.tracks, default=-1)+1)
+	
+	return mesh
 
-	def ply_write(mesh, file, **opts):
-		vertices = np.array(mesh.points, copy=False).astype(np.dtype([('x', 'f4'), ('y', 'f4'), ('z', 'f4')]))
-		faces = np.empty(len(mesh.faces), dtype=[('vertex_indices', 'u4', (3,)), ('group', 'u2')])
-		faces['vertex_indices'] = typedlist_to_numpy(mesh.faces, 'u4')
-		faces['group'] = typedlist_to_numpy(mesh.tracks, 'u4')
-		ev = PlyElement.describe(vertices, 'vertex')
-		ef = PlyElement.describe(faces, 'face')
-		PlyData([ev,ef], opts.get('text', False)).write(file)
+def ply_write(mesh, file, **opts):
+	from plyfile import PlyData, PlyElement
+	
+	vertices = np.array(mesh.points, copy=False).astype(np.dtype([('x', 'f4'), ('y', 'f4'), ('z', 'f4')]))
+	faces = np.empty(len(mesh.faces), dtype=[('vertex_indices', 'u4', (3,)), ('group', 'u2')])
+	faces['vertex_indices'] = typedlist_to_numpy(mesh.faces, 'u4')
+	faces['group'] = typedlist_to_numpy(mesh.tracks, 'u4')
+	ev = PlyElement.describe(vertices, 'vertex')
+	ef = PlyElement.describe(faces, 'face')
+	PlyData([ev,ef], opts.get('text', False)).write(file)
 
 
 '''
 	STL is loaded using numpy-stl module 	https://github.com/WoLpH/numpy-stl
 '''
-try:	
+def stl_read(file, **opts):
 	import stl
-except ImportError:	pass
-else:
-
-	from .mathutils import *
-	from .mesh import numpy_to_typedlist, typedlist_to_numpy
-	def stl_read(file, **opts):
-		stlmesh = stl.mesh.Mesh.from_file(file, calculate_normals=False)
-		trinum = stlmesh.points.shape[0]
-		mesh = Mesh(
-			numpy_to_typedlist(stlmesh.points.reshape(trinum*3, 3), vec3), 
-			typedlist(uvec3(i, i+1, i+2)  for i in range(0, 3*trinum, 3)),
-			)
-		mesh.options['name'] = stlmesh.name
-		return mesh
+	
+	stlmesh = stl.mesh.Mesh.from_file(file, calculate_normals=False)
+	trinum = stlmesh.points.shape[0]
+	mesh = Mesh(
+		numpy_to_typedlist(stlmesh.points.reshape(trinum*3, 3), vec3), 
+		numpy_to_typedlist(np.arange(3*trinum, dtype='u4').reshape(trinum, 3), uvec3),
+		)
+	mesh.options['name'] = stlmesh.name
+	return mesh
 
-	def stl_write(mesh, file, **opts):
-		stlmesh = stl.mesh.Mesh(np.zeros(len(mesh.faces), dtype=stl.mesh.Mesh.dtype), name=mesh.options.get('name'))
-		stlmesh.vectors[:] = typedlist_to_numpy(mesh.points, 'f4')[typedlist_to_numpy(mesh.faces, 'i4')]
-		stlmesh.save(file, **opts)
+def stl_write(mesh, file, **opts):
+	import stl
+	
+	stlmesh = stl.mesh.Mesh(np.zeros(len(mesh.faces), dtype=stl.mesh.Mesh.dtype), name=mesh.options.get('name'))
+	stlmesh.vectors[:] = typedlist_to_numpy(mesh.points, 'f4')[typedlist_to_numpy(mesh.faces, 'i4')]
+	stlmesh.save(file, **opts)
 
 '''
 	OBJ is loaded using the pywavefront module	https://github.com/pywavefront/PyWavefront
 	using the specifications from 	https://en.wikipedia.org/wiki/Wavefront_.obj_file
 '''
-try:
+def obj_read(file, **opts):
 	import pywavefront
-except ImportError:	pass
-else:
-	
-	def obj_read(file, **opts):
-		scene = pywavefront.Wavefront(file, parse=True, collect_faces=True)
-		points = [vec3(v[:3]) for v in scene.vertices]
-		faces = []
-		for sub in scene.meshes.values():
-			faces.extend(( tuple(f[:3]) for f in sub.faces ))
-		mesh = Mesh(points, faces)
-		if len(scene.meshes) == 1:
-			mesh.options['name'] = next(iter(scene.meshes))
-		return mesh
-	
-	# no write function available at this time
-	#def obj_write(mesh, file, **opts):
+	
+	scene = pywavefront.Wavefront(file, parse=True, collect_faces=True)
+	points = [vec3(v[:3]) for v in scene.vertices]
+	faces = []
+	for sub in scene.meshes.values():
+		faces.extend(( tuple(f[:3]) for f in sub.faces ))
+	mesh = Mesh(points, faces)
+	if len(scene.meshes) == 1:
+		mesh.options['name'] = next(iter(scene.meshes))
+	return mesh
+
+# no write function available at this time
+#def obj_write(mesh, file, **opts):
 
 '''
 	JSON is loaded using the builtin json module
@@ -214,37 +315,91 @@ else:
 	it can store many object types, not only shapes
 '''
 import json
+try:
+	import orjson
+except ImportError:
+	orjson = None
 
 class JSONEncoder(json.JSONEncoder):
 	def default(self, obj):
-		if isinstance(obj, (vec2,vec3,vec4,mat2,mat3,mat4,quat)):
-			return {'type':type(obj).__name__, 'content':list(obj)}
+		if isinstance(obj, glmtypes):
+			# flattened in the constructor arguments order (column-major for matrices)
+			return {'type':type(obj).__name__, 'content':np.asarray(memoryview(obj)).ravel('F').tolist()}
 		elif isinstance(obj, np.ndarray):
-			return {'type':'ndarray', 'dtype':obj.dtype, 'content':list(obj)}
+			return {'type':'ndarray', 'dtype':obj.dtype.str, 'content':obj.tolist()}
+		elif isinstance(obj, np.generic):
+			return obj.item()
 		elif isinstance(obj, Mesh):
-			return {'type':'Mesh', 'points': [tuple(p) for p in obj.points], 'faces':obj.faces, 'tracks':obj.tracks, 'groups':obj.groups}
+			return {'type':'Mesh', 
+					'points': typedlist_to_numpy(obj.points, 'f8').tolist(), 
+					'faces': typedlist_to_numpy(obj.faces, 'u4').tolist(), 
+					'tracks': typedlist_to_numpy(obj.tracks, 'u4').tolist(), 
+					'groups': obj.groups}
 		elif isinstance(obj, Web):
-			return {'type':'Web', 'points': [tuple(p) for p in obj.points], 'edges':obj.edges, 'tracks':obj.tracks, 'groups':obj.groups}
+			return {'type':'Web', 
+					'points': typedlist_to_numpy(obj.points, 'f8').tolist(), 
+					'edges': typedlist_to_numpy(obj.edges, 'u4').tolist(), 
+					'tracks': typedlist_to_numpy(obj.tracks, 'u4').tolist(), 
+					'groups': obj.groups}
 		else:
 			return json.JSONEncoder.default(self, obj)
 
 def jsondecode(obj):
 	if 'type' in obj:
 		t = obj['type']
-		if t in {'vec2','vec3','vec4','mat2','mat3','mat4','quat'}:		
-			return vec3(obj['content'])
+		if t in glmnames:
+			return glmnames[t](*obj['content'])
 		elif t == 'ndarray':
 			return np.array(obj['content'], dtype=obj['dtype'])
 		elif t == 'Mesh':
-			return Mesh([vec3(p) for p in obj['points']], [tuple(f) for f in obj['faces']], obj['tracks'], obj['groups'])
+			return Mesh(
+				numpy_to_typedlist(np.array(obj['points'], dtype='f8').reshape(-1,3), vec3), 
+				numpy_to_typedlist(np.array(obj['faces'], dtype='u4').reshape(-1,3), uvec3), 
+				typedlist(np.array(obj['tracks'], dtype='u4'), dtype='I'), 
+				obj['groups'])
 		elif t == 'Web':
-			return Mesh([vec3(p) for p in obj['points']], [tuple(f) for f in obj['edges']], obj['tracks'], obj['groups'])
+			return Web(
+				numpy_to_typedlist(np.array(obj['points'], dtype='f8').reshape(-1,3), vec3), 
+				numpy_to_typedlist(np.array(obj['edges'], dtype='u4').reshape(-1,2), uvec2), 
+				typedlist(np.array(obj['tracks'], dtype='u4'), dtype='I'), 
+				obj['groups'])
 		else:
 			raise FileFormatError('unable to load json for dumped type {}', t)
 	return obj
 	
 def json_read(file, **opts):
-	return json.load(open(file, 'r'), cls=JSONDecoder, **opts)
+	with open(file, 'r') as f:
+		return json.load(f, object_hook=jsondecode, **opts)
+
+def json_write(objs, file, fast=True, **opts):
+	# orjson is much faster at formatting numbers, but does not accept the json module options
+	# it also writes non-finite floats as null and rejects integers over 64 bits, so these cases are left to the json module
+	if orjson and fast and not opts and jsonfinite(objs):
+		try:
+			# OPT_SERIALIZE_NUMPY is not used because it would write arrays as plain lists instead of calling the encoder
+			data = orjson.dumps(objs, default=JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
+		except orjson.JSONEncodeError:
+			pass
+		else:
+			with open(file, 'wb') as f:
+				f.write(data)
+			return
+	with open(file, 'w') as f:
+		return json.dump(objs, f, cls=JSONEncoder, **opts)
 
-def json_write(objs, file, **opts):
-	return json.dump(open(file, 'w'), object_hook=jsondecode, **opts)
+def jsonfinite(obj) -> bool:
+	''' Return False if a float in `obj` is infinite or nan, the json module writes them as `NaN` or `Infinity` where orjson writes `null` '''
+	if isinstance(obj, (float, np.floating)):
+		return isfinite(float(obj))
+	elif isinstance(obj, (list, tuple)):
+		return all(map(jsonfinite, obj))
+	elif isinstance(obj, dict):
+		return all(map(jsonfinite, obj)) and all(map(jsonfinite, obj.values()))
+	elif isinstance(obj, np.ndarray):
+		if obj.dtype.kind in 'fc':	return bool(np.isfinite(obj).all())
+		if obj.dtype.kind == 'O':	return all(map(jsonfinite, obj.flat))
+	elif isinstance(obj, (Mesh, Web)):
+		return bool(np.isfinite(typedlist_to_numpy(obj.points, 'f8')).all()) and jsonfinite(obj.groups)
+	elif isinstance(obj, glmtypes):
+		return bool(np.isfinite(np.asarray(memoryview(obj))).all())
+	return True
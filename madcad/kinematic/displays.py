@@ -39,7 +39,7 @@ class SolidDisplay(Group):
 			if key == 'annotations' and not scene.options['display_annotations'] and not self.selected:
 				continue
 			for sub,target,priority,func in display.stack(scene):
-				yield ((key, *sub), target, priority, func)
+				yield ((key,)+sub, target, priority, func)
 
 
 class ChainManip(Group):
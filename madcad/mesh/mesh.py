@@ -205,7 +205,14 @@ class Mesh(NMesh):
 	
 	def facenormals(self) -> '[vec3]':
 		''' list normals for each face '''
-		return typedlist(map(self.facenormal, self.faces), vec3)
+		points = typedlist_to_numpy(self.points, 'f8')
+		faces = typedlist_to_numpy(self.faces, 'u4')
+		p0 = points[faces[:,0]]
+		normals = np.cross(points[faces[:,1]] - p0, points[faces[:,2]] - p0)
+		# same operations as glm's normalize, so the result matches facenormal to the bit
+		with np.errstate(invalid='ignore', divide='ignore'):
+			normals *= (1 / np.sqrt(normals[:,0]*normals[:,0] + normals[:,1]*normals[:,1] + normals[:,2]*normals[:,2]))[:,None]
+		return numpy_to_typedlist(normals, vec3)
 	
 	def edgenormals(self) -> '{uvec2: vec3}':
 		''' dict of normals for each UNORIENTED edge '''
@@ -348,7 +348,7 @@ class Ellipsis(object):
 	def display(self, scene):
 		return self.mesh().display(scene)
 		
-import numpy.core as np
+import numpy as np
 def glmarray(array, dtype='f4'):
 	''' Create a numpy array from a list of glm vec '''
 	buff = np.empty((len(array), len(array[0])), dtype=dtype)
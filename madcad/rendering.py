@@ -45,9 +45,11 @@
 import traceback
 from copy import copy, deepcopy
 from operator import itemgetter
+from functools import lru_cache
+from bisect import bisect_left
 
 import moderngl as mgl
-import numpy.core as np
+import numpy as np
 from PIL import Image
 from PyQt5.QtCore import QEvent, QPoint, Qt
 from PyQt5.QtGui import (QFocusEvent, QInputEvent, QKeyEvent, QMouseEvent,
@@ -254,6 +256,9 @@ def navigation_tool(dispatcher, view):
 			evt.ignore()	# ignore the keys to pass shortcuts to parents
 		elif evt.type() == QEvent.MouseButtonPress:
 			last = evt.pos()
+			# the widget is not resized during a drag, so its size is retrieved once
+			height = view.height()
+			middle = QPoint(view.width(), height)/2
 			if evt.button() == Qt.MiddleButton:
 				nav = 'rotate'
 			else:
@@ -264,17 +269,17 @@ def navigation_tool(dispatcher, view):
 		elif evt.type() == QEvent.MouseMove:
 			if nav:
 				moving = True
-				gap = evt.pos() - last
-				dx = gap.x()/view.height()
-				dy = gap.y()/view.height()
+				pos = evt.pos()
+				gap = pos - last
+				dx = gap.x()/height
+				dy = gap.y()/height
 				if nav == 'pan':		view.navigation.pan(dx, dy)
 				elif nav == 'rotate':	view.navigation.rotate(dx, dy, 0)
 				elif nav == 'zoom':		
-					middle = QPoint(view.width(), view.height())/2
 					f = (	(last-middle).manhattanLength()
-						/	(evt.pos()-middle).manhattanLength()	)
+						/	(pos-middle).manhattanLength()	)
 					view.navigation.zoom(f)
-				last = evt.pos()
+				last = pos
 				view.update()
 				evt.accept()
 		elif evt.type() == QEvent.MouseButtonRelease:
@@ -290,14 +295,16 @@ def navigation_tool(dispatcher, view):
 		elif isinstance(evt, QTouchEvent):
 			nav = None
 			pts = evt.touchPoints()
+			# each position is a new Qt object, so they are retrieved once
+			cur = [p.pos()  for p in pts]
+			prev = [p.lastPos()  for p in pts]
 			# view rotation
 			if len(pts) == 2:
-				startlength = (pts[0].lastPos()-pts[1].lastPos()).manhattanLength()
-				zoom = startlength / (pts[0].pos()-pts[1].pos()).manhattanLength()
-				displt = (	(pts[0].pos()+pts[1].pos()) /2 
-						-	(pts[0].lastPos()+pts[1].lastPos()) /2 ) /view.height()
-				dc = pts[0].pos() - pts[1].pos()
-				dl = pts[0].lastPos() - pts[1].lastPos()
+				dc = cur[0] - cur[1]
+				dl = prev[0] - prev[1]
+				zoom = dl.manhattanLength() / dc.manhattanLength()
+				displt = (	(cur[0]+cur[1]) /2 
+						-	(prev[0]+prev[1]) /2 ) /view.height()
 				rot = atan2(dc.y(), dc.x()) - atan2(dl.y(), dl.x())
 				view.navigation.zoom(zoom)
 				view.navigation.rotate(displt.x(), displt.y(), rot)
@@ -306,22 +313,10 @@ def navigation_tool(dispatcher, view):
 				evt.accept()
 			# view translation
 			elif len(pts) == 3:
-				lc = (	pts[0].lastPos() 
-					+	pts[1].lastPos() 
-					+	pts[2].lastPos() 
-					)/3
-				lr = (	(pts[0].lastPos() - lc) .manhattanLength()
-					+	(pts[1].lastPos() - lc) .manhattanLength()
-					+	(pts[2].lastPos() - lc) .manhattanLength()
-					)/3
-				cc = (	pts[0].pos() 
-					+	pts[1].pos() 
-					+	pts[2].pos() 
-					)/3
-				cr = (	(pts[0].pos() - cc) .manhattanLength()
-					+	(pts[1].pos() - cc) .manhattanLength()
-					+	(pts[2].pos() - cc) .manhattanLength()
-					)/3
+				lc = (prev[0] + prev[1] + prev[2]) /3
+				lr = sum((p - lc).manhattanLength()  for p in prev) /3
+				cc = (cur[0] + cur[1] + cur[2]) /3
+				cr = sum((p - cc).manhattanLength()  for p in cur) /3
 				zoom = lr / cr
 				displt = (cc - lc)  /view.height()
 				view.navigation.zoom(zoom)
@@ -345,6 +340,7 @@ class Turntable:
 		self.pitch = pitch
 		self.distance = distance
 		self.tool = navigation_tool
+		self.cache = (None, None)	# last view rotation with the angles it was computed for
 		
 	def rotate(self, dx, dy, dz):
 		if abs(self.pitch) > 3.2:	dx = -dx
@@ -353,15 +349,22 @@ class Turntable:
 		if self.pitch > pi:	self.pitch -= 2*pi
 		if self.pitch < -pi: self.pitch += 2*pi
 	def pan(self, dx, dy):
-		mat = transpose(fmat3(inverse(fquat(fvec3(pi/2-self.pitch, 0, -self.yaw)))))
+		mat = transpose(fmat3(self.rotation()))
 		self.center += ( mat[0] * -dx + mat[1] * dy) * self.distance/2
 	def zoom(self, f):
 		self.distance *= f
 	
+	def rotation(self) -> fquat:
+		''' Rotation of the view built from the euler angles, it is only recomputed when they change.
+			The returned quaternion is shared and must not be modified
+		'''
+		angles = (self.yaw, self.pitch)
+		if self.cache[0] != angles:
+			self.cache = (angles, inverse(fquat(fvec3(pi/2-self.pitch, 0, -self.yaw))))
+		return self.cache[1]
+	
 	def matrix(self) -> fmat4:
-		# build rotation from view euler angles
-		rot = inverse(fquat(fvec3(pi/2-self.pitch, 0, -self.yaw)))
-		mat = translate(fmat4(rot), -self.center)
+		mat = translate(fmat4(self.rotation()), -self.center)
 		mat[3][2] -= self.distance
 		return mat
 
@@ -551,7 +554,7 @@ class Scene:
 				sub,target,priority,func = frame
 				if target not in self.stacks:	self.stacks[target] = []
 				stack = self.stacks[target]
-				stack.append(((key,*sub), priority, func))
+				stack.append(((key,)+sub, priority, func))
 		# sort the stack using the specified priorities
 		for stack in self.stacks.values():
 			stack.sort(key=itemgetter(1))
@@ -604,8 +607,9 @@ class Scene:
 		'''
 		if former and former.update(self, obj):
 			return former
-		if type(obj) in overrides:
-			disp = overrides[type(obj)](self, obj)
+		override = overrides.get(type(obj))
+		if override:
+			disp = override(self, obj)
 		elif hasattr(obj, 'display'):
 			if isinstance(obj.display, type):
 				disp = obj.display(self, obj)
@@ -623,7 +627,10 @@ class Scene:
 
 def displayable(obj):
 	''' Return True if the given object has the matching signature to be added to a Scene '''
-	return type(obj) in overrides or hasattr(obj, 'display') and callable(obj.display) and not isinstance(obj, type)
+	if type(obj) in overrides:	
+		return True
+	# a single attribute lookup instead of hasattr followed by the access
+	return callable(getattr(obj, 'display', None)) and not isinstance(obj, type)
 
 
 class Step(Display):
@@ -701,7 +708,7 @@ class Group(Display):
 	def stack(self, scene):
 		for key,display in self.displays.items():
 			for sub,target,priority,func in display.stack(scene):
-				yield ((key, *sub), target, priority, func)
+				yield ((key,)+sub, target, priority, func)
 	
 	@writeproperty
 	def local(self, pose):
@@ -733,6 +740,18 @@ overrides = {
 	}
 
 
+def shader_ident(scene):
+	return scene.ctx.program(
+				vertex_shader=open(resourcedir+'/shaders/object-ident.vert').read(),
+				fragment_shader=open(resourcedir+'/shaders/ident.frag').read(),
+				)
+
+def shader_subident(scene):
+	return scene.ctx.program(
+				vertex_shader=open(resourcedir+'/shaders/object-item-ident.vert').read(),
+				fragment_shader=open(resourcedir+'/shaders/ident.frag').read(),
+				)
+
 class ViewCommon:
 	''' Common base for Qt's View rendering and Offscreen rendering. It provides common methods to render and interact with a view.
 		
@@ -745,15 +764,18 @@ class ViewCommon:
 
 		# render parameters
 		self.scene = scene if isinstance(scene, Scene) else Scene(scene)
-		self.uniforms = {'proj':fmat4(1), 'view':fmat4(1), 'projview':fmat4(1)}	# last frame rendering constants
+		self.uniforms = {'proj':fmat4(1), 'view':fmat4(1), 'projview':fmat4(1), 'invview':fmat4(1)}	# last frame rendering constants
 		self.targets = []
 		self.steps = []
 		self.step = 0
 		self.stepi = 0
 
 		# dump targets
+		self.fb_ident = None
 		self.map_depth = None
 		self.map_idents = None
+		self.buf_maps = None	# pixel buffer receiving the depth then ident maps on the GPU side
+		self.pool_maps = None	# memory of the maps, kept across resizes
 		self.fresh = set()	# set of refreshed internal variables since the last render
 
 	# -- internal frame system --
@@ -768,8 +790,9 @@ class ViewCommon:
 			self.makeCurrent()	# set the scene context as current opengl context
 			with self.scene.ctx as ctx:
 				#ctx.finish()
-				self.fb_ident.read_into(self.map_ident, viewport=self.fb_ident.viewport, components=2)
-				self.fb_ident.read_into(self.map_depth, viewport=self.fb_ident.viewport, components=1, attachment=-1, dtype='f4')
+				# the transfer to the pixel buffers was queued at render, so it is likely to be finished already
+				w, h = self.fb_ident.viewport[2:]
+				self.buf_maps.read_into(self.pool_maps, size=w*h*(4+self.map_ident.itemsize))
 			self.fresh.add('fb_ident')
 			#from PIL import Image
 			#Image.fromarray(self.map_ident*16, 'I;16').show()
@@ -780,10 +803,20 @@ class ViewCommon:
 		self.uniforms['view'] = view = self.navigation.matrix()
 		self.uniforms['proj'] = proj = self.projection.matrix(w/h if h > 0 else 0, self.navigation.distance)
 		self.uniforms['projview'] = proj * view
+		self.uniforms['invview'] = affineInverse(view)	# computed once for all the unprojections until the next frame
 		self.fresh.clear()
 
 		# call the render stack
 		self.scene.render(self)
+		# queue the transfer of the ident frame to pixel buffers, so that refreshmaps doesn't stall on the whole readback
+		with self.scene.ctx:
+			w, h = self.fb_ident.viewport[2:]
+			# idents are stored in little endian over the color channels, when they all fit in the first channel there is no need to transfer the second
+			width = 1 if self.step <= 0x100 else 2
+			self.fb_ident.read_into(self.buf_maps, viewport=self.fb_ident.viewport, components=1, attachment=-1, dtype='f4')
+			self.fb_ident.read_into(self.buf_maps, viewport=self.fb_ident.viewport, components=width, write_offset=w*h*4)
+		if self.map_ident.itemsize != width:
+			self.map_ident = self.pool_maps[w*h*4:w*h*(4+width)].view('u{}'.format(width)).reshape(h,w)[::-1]
 
 	def identstep(self, nidents):
 		''' Updates the amount of rendered idents and return the start ident for the calling rendering pass?
@@ -825,18 +858,23 @@ class ViewCommon:
 		else:
 			raise ValueError(f"background_color must be a RGB or RGBA tuple, currently {background}")
 
+	def init_maps(self, size):
+		''' Internal method to (re)allocate the ident maps and their pixel buffers for the given frame size '''
+		w, h = size
+		# buffers are only grown, so resizing a window doesn't reallocate them on each step
+		# both maps share one buffer so they come back in a single transfer, depth is first to keep the floats aligned
+		if not self.buf_maps or self.buf_maps.size < w*h*6:
+			if self.buf_maps:	self.buf_maps.release()
+			self.buf_maps = self.scene.ctx.buffer(reserve=w*h*6)
+			self.pool_maps = np.empty(w*h*6, dtype='u1')
+		# opengl frames are bottom-up, the maps are flipped views so they index like the window: [y, x]
+		self.map_depth = self.pool_maps[:w*h*4].view('f4').reshape(h,w)[::-1]
+		self.map_ident = self.pool_maps[w*h*4:w*h*6].view('u2').reshape(h,w)[::-1]
+
 	def preload(self):
-		''' Internal method to load common resources '''
-		ctx, resources = self.scene.ctx, self.scene.resources
-		resources['shader_ident'] = ctx.program(
-					vertex_shader=open(resourcedir+'/shaders/object-ident.vert').read(),
-					fragment_shader=open(resourcedir+'/shaders/ident.frag').read(),
-					)
-
-		resources['shader_subident'] = ctx.program(
-					vertex_shader=open(resourcedir+'/shaders/object-item-ident.vert').read(),
-					fragment_shader=open(resourcedir+'/shaders/ident.frag').read(),
-					)
+		''' Internal method to load common resources, they are compiled only once per scene even if several views use it '''
+		self.scene.resource('shader_ident', shader_ident)
+		self.scene.resource('shader_subident', shader_subident)
 
 	# -- methods to deal with the view --
 
@@ -847,35 +885,67 @@ class ViewCommon:
 		if radius is None:
 			radius = settings.controls['snap_dist']
 		self.refreshmaps()
-		for x,y in snailaround(point, (self.map_ident.shape[1], self.map_ident.shape[0]), radius):
-			ident = int(self.map_ident[-y, x])
-			if ident:
-				return uvec2(x,y)
+		# look at the whole snail at once, in the same order as snailaround
+		h, w = self.map_ident.shape
+		around = snailoffsets(radius) + (point.x, point.y)
+		x, y = around[:,0], around[:,1]
+		around = around[(0 <= x) & (x < w) & (0 <= y) & (y < h)]
+		found = self.map_ident[around[:,1], around[:,0]].nonzero()[0]
+		if len(found):
+			x, y = around[found[0]]
+			return uvec2(int(x), int(y))
 
 	def ptat(self, point: ivec2) -> fvec3:
 		''' Return the point of the rendered surfaces that match the given window coordinates '''
 		self.refreshmaps()
 		viewport = self.fb_ident.viewport
-		depthred = float(self.map_depth[-point.y,point.x])
+		depthred = float(self.map_depth[point.y, point.x])
 		x =  (point.x/viewport[2] *2 -1)
 		y = -(point.y/viewport[3] *2 -1)
 
 		if depthred == 1.0:
 			return None
 		else:
-			view = self.uniforms['view']
 			proj = self.uniforms['proj']
 			a,b = proj[2][2], proj[3][2]
 			depth = b/(depthred + a) * 0.5	# TODO get the true depth  (can't get why there is a strange factor ... opengl trick)
 			#near, far = self.projection.limits  or settings.display['view_limits']
 			#depth = 2 * near / (far + near - depthred * (far - near))
 			#print('depth', depth, depthred)
-			return vec3(fvec3(affineInverse(view) * fvec4(
+			return vec3(fvec3(self.uniforms['invview'] * fvec4(
 						depth * x /proj[0][0],
 						depth * y /proj[1][1],
 						-depth,
 						1)))
 
+	def ptsat(self, points: 'ndarray') -> 'ndarray':
+		''' Same as `ptat` for an array of window coordinates of shape (n,2), all unprojected at once.
+			Return an array of shape (n,3) of 3D points in the same order, with NaN rows where there is no surface
+			
+			Coordinates are not checked: as with numpy indexing, negative ones silently wrap to the other side of the frame, and the ones past its size raise `IndexError`
+		'''
+		self.refreshmaps()
+		viewport = self.fb_ident.viewport
+		points = np.asarray(points, dtype='i4').reshape(-1,2)
+		depthred = self.map_depth[points[:,1], points[:,0]]
+		x =  (points[:,0].astype('f4')/viewport[2] *2 -1)
+		y = -(points[:,1].astype('f4')/viewport[3] *2 -1)
+		
+		proj = self.uniforms['proj']
+		a,b = proj[2][2], proj[3][2]
+		depth = b/(depthred + a) * 0.5
+		# the numpy view of a glm matrix is indexed [row, column], the points are rows here so it is transposed
+		invview = np.asarray(memoryview(self.uniforms['invview'])).T
+		camera = np.stack([
+					depth * x /proj[0][0],
+					depth * y /proj[1][1],
+					-depth,
+					np.ones(len(points), dtype='f4'),
+					], axis=1)
+		world = (camera @ invview)[:,:3].astype('f8')
+		world[depthred == 1.0] = np.nan
+		return world
+
 	def ptfrom(self, point: ivec2, center: fvec3) -> fvec3:
 		''' 3D point below the cursor in the plane orthogonal to the sight, with center as origin '''
 		view = self.uniforms['view']
@@ -884,7 +954,7 @@ class ViewCommon:
 		x =  (point.x/viewport[2] *2 -1)
 		y = -(point.y/viewport[3] *2 -1)
 		depth = (view * fvec4(fvec3(center),1))[2]
-		return vec3(fvec3(affineInverse(view) * fvec4(
+		return vec3(fvec3(self.uniforms['invview'] * fvec4(
 					-depth * x /proj[0][0],
 					-depth * y /proj[1][1],
 					depth,
@@ -896,12 +966,12 @@ class ViewCommon:
 		'''
 		self.refreshmaps()
 		point = uvec2(point)
-		ident = int(self.map_ident[-point.y, point.x])
+		ident = int(self.map_ident[point.y, point.x])
 		if ident and 'ident' in self.scene.stacks:
-			rdri = bisect(self.steps, ident)
+			# first render pass whose last ident is not below the searched one, passes without idents are skipped this way
+			rdri = bisect_left(self.steps, ident)
 			if rdri == len(self.steps):
 				print('internal error: object ident points out of idents list')
-			while rdri > 0 and self.steps[rdri-1] == ident:	rdri -= 1
 			if rdri > 0:	subi = ident - self.steps[rdri-1] - 1
 			else:			subi = ident - 1
 			
@@ -919,8 +989,9 @@ class ViewCommon:
 			This is changing the camera direction, center and distance.
 		'''
 		if not position:	position = self.scene.box().center
+		if not isfinite(position):	return
 		dir = position - fvec3(affineInverse(self.navigation.matrix())[3])
-		if not dot(dir,dir) > 1e-6 or not isfinite(position):	return
+		if not dot(dir,dir) > 1e-6:	return
 
 		if isinstance(self.navigation, Turntable):
 			self.navigation.yaw = atan2(dir.x, dir.y)
@@ -994,8 +1065,7 @@ class Offscreen(ViewCommon):
 		self.fb_ident = ctx.simple_framebuffer(size, components=3, dtype='f1')
 		self.targets = [ ('screen', self.fb_screen, self.setup_screen),
 						 ('ident', self.fb_ident, self.setup_ident)]
-		self.map_ident = np.empty((h,w), dtype='u2')
-		self.map_depth = np.empty((h,w), dtype='f4')
+		self.init_maps((w, h))
 		
 	@property
 	def size(self):		
@@ -1011,6 +1081,10 @@ class Offscreen(ViewCommon):
 		if size != self.fb_screen.size:
 			self.ctx.finish()
 			self.init(size)
+	
+	def makeCurrent(self):
+		''' Counterpart of the Qt method, the standalone context is made current by the scene when entering it so there is nothing to do '''
+		pass
 
 	def render(self):
 		super().render()
@@ -1054,11 +1128,20 @@ class View(ViewCommon, QOpenGLWidget):
 
 		# self.fb_screen is already created and sized by Qt
 		self.fb_screen = ctx.detect_framebuffer(self.defaultFramebufferObject())
-		self.fb_ident = ctx.simple_framebuffer((w, h), components=3, dtype='f1')
+		# the ident frame is only grown, so resizing the window doesn't reallocate it on each step
+		if not self.fb_ident or self.fb_ident.width < w or self.fb_ident.height < h:
+			if self.fb_ident:
+				size = max(w, self.fb_ident.width), max(h, self.fb_ident.height)
+				for attachment in (*self.fb_ident.color_attachments, self.fb_ident.depth_attachment):
+					attachment.release()
+				self.fb_ident.release()
+			else:
+				size = w, h
+			self.fb_ident = ctx.simple_framebuffer(size, components=3, dtype='f1')
+		self.fb_ident.viewport = (0, 0, w, h)
 		self.targets = [ ('screen', self.fb_screen, self.setup_screen),
 						 ('ident', self.fb_ident, self.setup_ident)]
-		self.map_ident = np.empty((h,w), dtype='u2')
-		self.map_depth = np.empty((h,w), dtype='f4')
+		self.init_maps((w, h))
 
 	def render(self):
 		# set the opengl current context from Qt (doing it only from moderngl interferes with Qt)
@@ -1131,18 +1214,20 @@ class View(ViewCommon, QOpenGLWidget):
 		'''
 		disp = self.scene.displays
 		stack = []
+		accepted = evt.isAccepted
 		for i in range(1,len(key)):
 			disp = disp[key[i-1]]
 			disp.control(self, key[:i], key[i:], evt)
-			if evt.isAccepted(): return
+			if accepted(): return
 			stack.append(disp)
 
 		if evt.type() == QEvent.MouseButtonPress and evt.button() == Qt.LeftButton:
 			disp = stack[-1]
 			# select what is under cursor
-			if type(disp).__name__ in ('SolidDisplay', 'WebDisplay'):
-				disp.vertices.selectsub(key[-1])
-				disp.selected = any(disp.vertices.flags & 0x1)
+			vertices = getattr(disp, 'vertices', None)
+			if vertices is not None:
+				vertices.selectsub(key[-1])
+				disp.selected = bool((vertices.flags & 0x1).any())
 			else:
 				disp.selected = not disp.selected
 			# make sure that a display is selected if one of its sub displays is
@@ -1188,14 +1273,17 @@ class View(ViewCommon, QOpenGLWidget):
 class GhostWidget(QWidget):
 	def __init__(self, parent):
 		super().__init__(parent)
+		# the ghost never changes parent, so the view handlers are retrieved once for all the events
+		self.view_input = parent.inputEvent
+		self.view_event = parent.event
 		
 	def event(self, evt):
 		if isinstance(evt, QInputEvent):
 			evt.ignore()
-			self.parent().inputEvent(evt)
+			self.view_input(evt)
 			if evt.isAccepted():	return True
 		elif isinstance(evt, QFocusEvent):
-			self.parent().event(evt)
+			self.view_event(evt)
 		return super().event(evt)
 
 
@@ -1209,6 +1297,11 @@ def snail(radius):
 		for x in reversed(range(-r,r)):	yield ivec2(x, r)
 		for y in reversed(range(-r,r)):	yield ivec2(-r,y)
 
+@lru_cache()
+def snailoffsets(radius):
+	''' Array of the coordinates yielded by `snail`, shape is (n,2) '''
+	return np.array([tuple(p) for p in snail(radius)], dtype='i4').reshape(-1,2)
+
 def snailaround(pt, box, radius):
 	''' Generator of coordinates snailing around pt, coordinates that goes out of the box are skipped '''
 	cx,cy = pt
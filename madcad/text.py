@@ -25,7 +25,7 @@ from .mesh import Wire, Web, Mesh, web
 from . import settings, rendering
 
 from PIL import Image, ImageFont, ImageDraw
-import numpy.core as np
+import numpy as np
 import moderngl as mgl
 
 
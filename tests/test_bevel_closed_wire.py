@@ -1,4 +1,4 @@
-from pytest import approx
+from pytest import approx, raises
 from math import pi, sqrt
 
 from madcad import (
@@ -7,6 +7,9 @@ from madcad import (
 	Wire,
 	# Web,
 	Mesh,
+	MeshError,
+	Box,
+	brick,
 	show,
 	extrusion,
 	ArcThrough,
@@ -15,6 +18,7 @@ from madcad import (
 from madcad.bevel import (
 	filet,
 	chamfer,
+	edgecut,
 	)
 
 
@@ -114,6 +118,13 @@ def test_bevel(plot=False):
 	assert profile.length() == approx(expected_len, abs=0.05)  # large tolerance because the bevel isn't an actual arc, and is discretized
 
 
+def test_edgecut_aligned_loop():
+	# all the cutting planes are parallel, so no junction of this closed loop can get a separator
+	cube = brick(Box(center=vec3(0), width=vec3(2)))
+	with raises(MeshError):
+		edgecut(cube, [(0,1), (1,2), (2,3), (0,3)], cutter=lambda n1, n2: vec3(0, 0, -0.3))
+
+
 if __name__ == "__main__":
 	test_cut_curve(True)
 	test_chamfer(True)
@@ -0,0 +1,43 @@
+from madcad import vec3, Box, brick, cylinder
+from madcad.bevel import filet, chamfer
+
+# the cut points only need to be equal up to rounding, but rounding differences can flip the diagonal of the quads at ties
+# so the topology of the result is checked, not only that the operation runs
+
+cube_edges = [(0,1),(1,2),(2,3),(0,3),(1,5),(0,4)]
+
+def cube():
+	return brick(Box(center=vec3(0), width=vec3(2)))
+
+def cylinder_edges():
+	mesh = cylinder(vec3(0), vec3(0,0,2), 1, resolution=('div',40))
+	return mesh, list(mesh.frontiers(0,1).edges) + list(mesh.frontiers(1,2).edges)
+
+def check_result(mesh, faces, closed=True):
+	assert len(mesh.faces) == faces
+	mesh.mergeclose()
+	mesh.check()
+	assert mesh.issurface()
+	if closed:
+		assert mesh.isenvelope()
+
+def test_filet_cube():
+	mesh = cube()
+	filet(mesh, cube_edges, width=0.3)
+	# the corners where 3 rounded edges meet are not closed
+	check_result(mesh, 640, closed=False)
+
+def test_chamfer_cube():
+	mesh = cube()
+	chamfer(mesh, cube_edges, width=0.3)
+	check_result(mesh, 28)
+
+def test_filet_cylinder():
+	mesh, edges = cylinder_edges()
+	filet(mesh, edges, width=0.2)
+	check_result(mesh, 898)
+
+def test_chamfer_cylinder():
+	mesh, edges = cylinder_edges()
+	chamfer(mesh, edges, width=0.2)
+	check_result(mesh, 242)
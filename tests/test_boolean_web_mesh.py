@@ -1,5 +1,5 @@
 from madcad import *
-from madcad.boolean import pierce, pierce_web_mesh, cut_web_mesh
+from madcad.boolean import pierce, pierce_web_mesh, cut_web_mesh, faces_map
 
 mesh = extrusion(Circle((O,Z),1), Z, alignment=0.5)
 
@@ -15,20 +15,18 @@ others = {
 	}
 
 results = []
+prox = faces_map(mesh)	# the mesh is the same for all the cuts
 for i, w in others.items():
 	nprint('* w={} '.format(i))
 	
-	r = pierce(w, mesh, False)
+	r = pierce(w, mesh, False, prox=prox)
 	r.check()
 	assert r.isline()
-	results.append(Solid(content=r, mesh=mesh))
+	results.append(Solid(translate(2*len(results)*Y), content=r, mesh=mesh))
 	
-	r = pierce(w, mesh, True)
+	r = pierce(w, mesh, True, prox=prox)
 	r.check()
 	assert r.isline()
-	results.append(Solid(content=r, mesh=mesh))
-
-for i, result in enumerate(results):
-	result.position += 2*i*Y
+	results.append(Solid(translate(2*len(results)*Y), content=r, mesh=mesh))
 
 show(results, options={'display_points':True})
@@ -1,5 +1,6 @@
 from madcad import *
 from madcad import gear
+from pytest import approx
 
 settings.resolution = ('rad', 0.05)
 
@@ -13,6 +14,13 @@ e = 0.5*h
 p = step*z / (2*pi)
 prof = gear.gearprofile(step, z, h, e, alpha)
 
+# the innermost point comes first, it must still be taken as the minimum
+assert gear.minmax_radius(typedlist([vec3(0.5,0,0), vec3(0,2,0), vec3(1,0,0)])) == (0.5, 2)
+assert gear.minmax_radius(prof.points) == approx((
+	min(length(p.xy)  for p in prof.points), 
+	max(length(p.xy)  for p in prof.points),
+	))
+
 show([
 	vec3(0),
 	vec3(1,0,0),
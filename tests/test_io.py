@@ -2,6 +2,7 @@ from madcad.mathutils import vec3
 from madcad.mesh import Web
 from madcad.generation import extrusion
 from madcad.io import *
+import os
 
 original = extrusion(
 		Web(
@@ -23,3 +24,58 @@ write(original, 'tests/test_io.stl')
 stl = read('tests/test_io.stl')
 stl.check()
 assert stl.issurface()
+
+# test json
+write(original, 'tests/test_io.json')
+json = read('tests/test_io.json')
+json.check()
+assert json.issurface()
+assert list(json.points) == list(original.points)
+
+# values that orjson doesn't write like the json module must give the same result in both paths
+import numpy as np
+from math import isnan
+special = {'scalar': np.float64(1.5), 'int': np.int32(3), 'big': 2**70, 'nan': float('nan'), 'array': np.arange(3.)}
+for fast in (True, False):
+	write(special, 'tests/test_io_special.json', fast=fast)
+	loaded = read('tests/test_io_special.json')
+	assert loaded['scalar'] == 1.5 and loaded['int'] == 3
+	assert loaded['big'] == 2**70
+	assert isnan(loaded['nan'])
+	assert loaded['array'].tolist() == [0., 1., 2.]
+os.remove('tests/test_io_special.json')
+
+# test cachefunc
+import shutil, tempfile
+from madcad import io
+io.cachedir = tempfile.mkdtemp()
+calls = []
+
+@cachefunc
+def cached(a, b=2):
+	calls.append((a, b))
+	return a + b
+
+# equivalent calls share the same cache file
+assert cached(1, 2) == cached(1, b=2) == cached(1) == cached(a=1) == 3
+assert len(calls) == 1
+assert len(os.listdir(io.cachedir)) == 1
+
+@cachefunc
+def variadic(*args, **kwargs):
+	calls.append(args)
+	return len(args) + len(kwargs)
+
+# keywords order doesn't matter
+assert variadic(1, x=1, y=2) == variadic(1, y=2, x=1) == 3
+assert len(calls) == 2
+
+# invalid calls are still rejected by the function
+try:
+	cached(1, c=1)
+except TypeError:
+	pass
+else:
+	raise AssertionError('invalid call accepted')
+
+shutil.rmtree(io.cachedir)
@@ -0,0 +1,26 @@
+from madcad import *
+from madcad.rendering import Scene, Offscreen
+import numpy as np
+
+scene = Scene({'brick': brick(Box(width=vec3(1)))})
+view = Offscreen(scene, uvec2(200,150))
+# the offscreen view does not dequeue the scene itself
+with scene.ctx:
+	scene.dequeue()
+view.adjust(Box(center=fvec3(0), width=fvec3(3)))
+view.render()
+
+# a grid of window coordinates, crossing the brick and the background
+points = np.array([(x,y)  for y in range(0, 150, 10)  for x in range(0, 200, 10)])
+found = view.ptsat(points)
+assert found.shape == (len(points), 3)
+hits = 0
+for point, pt in zip(points, found):
+	expected = view.ptat(ivec2(*point))
+	if expected is None:
+		assert np.isnan(pt).all()
+	else:
+		assert np.allclose(pt, list(expected), atol=1e-5)
+		hits += 1
+# both cases must have been checked
+assert 0 < hits < len(points)